@@ -7,25 +7,40 @@ E13 OCR Bot — Telegram бот для распознавания текста 
 """
 
 import asyncio
-import base64
-import json
+import functools
+import gzip
 import logging
 import os
 import signal
+import stat
 import sys
+import time
 from io import BytesIO
-from typing import Optional
+from pathlib import Path
+from typing import Final, Optional
 
 import httpx
+import orjson
+import pybase64
 from dotenv import load_dotenv
-from telegram import Update
+from PIL import Image, ImageOps, UnidentifiedImageError
+from telegram import File, Message, Update
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     ContextTypes,
     MessageHandler,
     filters,
 )
+from telegram.request import HTTPXRequest
+
+try:
+    import uvloop
+except ImportError:  # uvloop недоступен на Windows
+    uvloop = None
 
 # ---------------------------------------------------------------------------
 # Загрузка переменных окружения
@@ -45,6 +60,60 @@ QWEN_MODEL_ID: str = "vision-model"
 API_TIMEOUT: int = 30  # секунд
 MAX_TOKENS: int = 4096
 
+# Максимальный размер изображения (совпадает с лимитом getFile в Bot API)
+MAX_IMAGE_BYTES: int = 20 << 20
+
+# Изображения крупнее по длинной стороне уменьшаются перед отправкой:
+# качество OCR выше ~2000 px не растёт, а размер запроса — растёт
+MAX_IMAGE_SIDE: int = 2048
+JPEG_QUALITY: int = 85
+
+# Сколько апдейтов Telegram обрабатывается одновременно
+CONCURRENT_UPDATES: int = 32
+
+# Сколько раз повторять запрос к Bot API после RetryAfter (429)
+TELEGRAM_MAX_RETRIES: int = 3
+
+# Общий HTTP-клиент для Qwen API: создаётся при старте бота (post_init)
+# и переиспользует keep-alive соединения между запросами
+QWEN_CLIENT: Optional[httpx.AsyncClient] = None
+
+# Сжатие тела запроса к Vision API (Content-Encoding: gzip). Включается
+# переменной окружения; если сервер ответит 415, сжатие отключается
+# до перезапуска и запрос повторяется без него
+QWEN_GZIP_REQUESTS: bool = os.getenv("QWEN_GZIP_REQUESTS", "0") == "1"
+GZIP_LEVEL: int = 1
+_gzip_enabled: bool = QWEN_GZIP_REQUESTS
+
+# Повторы при ошибке соединения с Qwen: пауза удваивается с каждой попыткой
+CONNECT_RETRIES: int = 1
+CONNECT_RETRY_DELAY: float = 0.5  # секунд
+
+# Одновременных запросов к Vision API не больше QWEN_MAX_CONCURRENCY:
+# остальные ждут в очереди, а не получают 429 всей толпой.
+# Значение из окружения проверяется в main(), семафор создаётся в post_init
+QWEN_MAX_CONCURRENCY_ENV: str = os.getenv("QWEN_MAX_CONCURRENCY", "8")
+QWEN_MAX_CONCURRENCY: int = 0
+_VISION_SEM: Optional[asyncio.Semaphore] = None
+
+# Повторы при перегрузке Qwen (429 / 503): пауза берётся из Retry-After,
+# иначе удваивается с каждой попыткой
+RETRY_STATUS_CODES: tuple[int, ...] = (429, 503)
+STATUS_RETRIES: int = 2
+STATUS_RETRY_DELAY: float = 1.0  # секунд
+STATUS_RETRY_MAX_DELAY: float = 30.0  # секунд
+
+
+# ---------------------------------------------------------------------------
+# Обновление OAuth-токена Qwen
+# ---------------------------------------------------------------------------
+QWEN_OAUTH_TOKEN_URL: str = "https://chat.qwen.ai/api/v1/oauth2/token"
+QWEN_OAUTH_CLIENT_ID: str = "f0304373b74a44d2b584a3fb70ca9e56"
+# Обновляем, если до истечения токена осталось менее 2 часов
+REFRESH_THRESHOLD_SEC: int = 7200
+# Как часто проверять срок действия токена
+REFRESH_CHECK_INTERVAL_SEC: int = 1800
+
 # ---------------------------------------------------------------------------
 # Промпт для Vision API
 # ---------------------------------------------------------------------------
@@ -59,6 +128,66 @@ VISION_PROMPT: str = (
     "Верни только извлечённый текст в markdown, без своих комментариев."
 )
 
+# ---------------------------------------------------------------------------
+# Тексты сообщений
+# ---------------------------------------------------------------------------
+WELCOME_TEXT: Final[str] = (
+    "👋 *Привет!*\n\n"
+    "Я бот для распознавания текста с изображений.\n\n"
+    "📸 *Как пользоваться:*\n"
+    "1. Отправь мне фотографию или изображение-документ\n"
+    "2. Подожди несколько секунд\n"
+    "3. Получи распознанный текст в формате Markdown\n\n"
+    "💡 *Совет:* Для лучшего качества отправляй изображение "
+    "как документ (без сжатия).\n\n"
+    "Поддерживаемые форматы: JPEG, PNG, WebP, GIF."
+)
+
+# Заголовок ответа с распознанным текстом и лимиты длины сообщения Telegram
+REPLY_HEADER: Final[str] = "📝 *Текст:*\n\n"
+TELEGRAM_MAX_MESSAGE_LEN: Final[int] = 4096
+REPLY_CHUNK_LEN: Final[int] = 4000
+
+# Таблица экранирования для MarkdownV2: распознанный текст показывается
+# как есть, без попыток Telegram интерпретировать разметку модели
+_MDV2: Final[dict[int, str]] = str.maketrans(
+    {c: "\\" + c for c in "\\_*[]()~`>#+-=|{}.!"}
+)
+
+# Сообщения об HTTP-ошибках Vision API; все коды 5xx сводятся к ключу 500
+_HTTP_ERR_MSG: Final[dict[int, str]] = {
+    401: "🔑 Ошибка авторизации. Проверьте токен API.",
+    429: "🚦 Превышен лимит запросов. Попробуйте позже.",
+    500: "🔧 Сервер временно недоступен. Попробуйте позже.",
+}
+
+# Тело запроса к Vision API сериализуется один раз: при каждом вызове
+# между префиксом и суффиксом подставляется только base64 изображения
+_B64_PLACEHOLDER: str = "__B64__"
+_PAYLOAD_PREFIX, _PAYLOAD_SUFFIX = orjson.dumps(
+    {
+        "model": QWEN_MODEL_ID,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{_B64_PLACEHOLDER}"
+                        },
+                    },
+                    {
+                        "type": "text",
+                        "text": VISION_PROMPT,
+                    },
+                ],
+            }
+        ],
+        "max_tokens": MAX_TOKENS,
+    }
+).split(_B64_PLACEHOLDER.encode("ascii"))
+
 # ---------------------------------------------------------------------------
 # Логирование
 # ---------------------------------------------------------------------------
@@ -73,20 +202,38 @@ logger = logging.getLogger("e13ocrbot")
 # Работа с Qwen Vision API
 # =========================================================================
 
+@functools.lru_cache(maxsize=4)
+def _parse_creds(mtime_ns: int, size: int) -> dict:
+    """
+    Читает и разбирает oauth_creds.json.
+
+    Аргументы служат только ключом кэша: пока mtime и размер файла
+    не изменились, повторный разбор не выполняется. Размер страхует
+    от совпадения mtime при грубой точности временных меток ФС.
+    Возвращаемый dict общий для всех вызовов — не изменять.
+    """
+    logger.debug("Разбор %s", QWEN_OAUTH_CREDS_PATH)
+    return orjson.loads(Path(QWEN_OAUTH_CREDS_PATH).read_bytes())
+
+
+def _load_creds() -> dict:
+    """Возвращает содержимое oauth_creds.json, разбирая файл только при изменении."""
+    st = os.stat(QWEN_OAUTH_CREDS_PATH)
+    return _parse_creds(st.st_mtime_ns, st.st_size)
+
+
 def get_qwen_token() -> str:
     """
     Получает актуальный OAuth-токен Qwen.
 
     Читает access_token из oauth_creds.json.
     Директория ~/.qwen/ монтируется в контейнер через docker-compose,
-    поэтому изменения файла на хосте видны сразу.
+    поэтому изменения файла на хосте видны сразу. Пока файл не менялся,
+    обращение сводится к os.stat и поиску в кэше.
     """
     try:
-        with open(QWEN_OAUTH_CREDS_PATH, "r", encoding="utf-8") as f:
-            creds = json.load(f)
-        token = creds.get("access_token", "")
+        token = _load_creds().get("access_token", "")
         if token:
-            logger.debug("OAuth-токен прочитан из %s", QWEN_OAUTH_CREDS_PATH)
             return token
         else:
             logger.error("Поле access_token пустое в %s", QWEN_OAUTH_CREDS_PATH)
@@ -94,62 +241,126 @@ def get_qwen_token() -> str:
     except FileNotFoundError:
         logger.error("Файл %s не найден", QWEN_OAUTH_CREDS_PATH)
         raise
-    except (json.JSONDecodeError, OSError) as exc:
+    except (orjson.JSONDecodeError, OSError) as exc:
         logger.error("Ошибка чтения %s: %s", QWEN_OAUTH_CREDS_PATH, exc)
         raise
 
 
-async def call_vision_api(image_base64: str) -> str:
+async def _post_with_retry(content: bytes, headers: dict) -> httpx.Response:
+    """
+    POST-запрос к Vision API с повтором при ошибке соединения.
+
+    Запрос не успел дойти до сервера, поэтому повтор безопасен.
+    """
+    if QWEN_CLIENT is None:
+        raise RuntimeError("HTTP-клиент Qwen не инициализирован")
+
+    attempt: int = 0
+    while True:
+        try:
+            return await QWEN_CLIENT.post(QWEN_API_URL, content=content, headers=headers)
+        except httpx.ConnectError as exc:
+            if attempt >= CONNECT_RETRIES:
+                raise
+            delay: float = CONNECT_RETRY_DELAY * 2**attempt
+            logger.warning("Ошибка соединения с Vision API (%s), повтор через %.1f с", exc, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def _send_payload(
+    body: bytes, compressed: Optional[bytes], headers: dict
+) -> httpx.Response:
+    """
+    Отправляет тело запроса в Vision API — сжатое gzip, если оно передано
+    и сжатие ещё не отключено.
+
+    При ответе 415 на сжатый запрос сжатие отключается и запрос
+    повторяется без него.
     """
-    Отправляет base64-изображение в Qwen Vision API и возвращает
-    распознанный текст.
+    global _gzip_enabled
+    if compressed is not None and _gzip_enabled:
+        response = await _post_with_retry(
+            compressed, {**headers, "Content-Encoding": "gzip"}
+        )
+        if response.status_code != 415:
+            return response
+        logger.warning("Vision API не принимает gzip — сжатие запросов отключено")
+        _gzip_enabled = False
+    return await _post_with_retry(body, headers)
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Пауза перед повтором: Retry-After в секундах или экспоненциальная."""
+    try:
+        delay = float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        delay = STATUS_RETRY_DELAY * 2**attempt
+    return min(max(delay, 0.0), STATUS_RETRY_MAX_DELAY)
+
+
+async def call_vision_api(image: bytes | bytearray) -> str:
+    """
+    Кодирует изображение в base64, отправляет в Qwen Vision API
+    и возвращает распознанный текст.
 
     Args:
-        image_base64: Строка с изображением в формате base64 (без префикса).
+        image: Исходные байты изображения.
 
     Returns:
         Распознанный текст или сообщение об ошибке.
 
     Raises:
         httpx.TimeoutException: При превышении таймаута.
-        httpx.HTTPStatusError: При HTTP-ошибке от API.
+        httpx.ConnectError: Если соединение не удалось и после повтора.
+        httpx.HTTPStatusError: При HTTP-ошибке от API (429 и 503 —
+            после исчерпания повторов).
     """
-    payload: dict = {
-        "model": QWEN_MODEL_ID,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_base64}"
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": VISION_PROMPT,
-                    },
-                ],
-            }
-        ],
-        "max_tokens": MAX_TOKENS,
-    }
+    # Кодирование больших файлов — CPU-работа, выносим её из event loop
+    image_b64: bytes = await asyncio.to_thread(pybase64.b64encode, image)
 
     headers: dict = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {get_qwen_token()}",
     }
 
-    async with httpx.AsyncClient(timeout=API_TIMEOUT) as client:
-        response = await client.post(
-            QWEN_API_URL,
-            json=payload,
-            headers=headers,
-        )
-        response.raise_for_status()
+    # Алфавит base64 не требует экранирования в JSON — вставляем как есть
+    body: bytes = _PAYLOAD_PREFIX + image_b64 + _PAYLOAD_SUFFIX
+    # Сжимаем один раз — повторы ниже отправляют то же тело
+    compressed: Optional[bytes] = (
+        await asyncio.to_thread(gzip.compress, body, GZIP_LEVEL)
+        if _gzip_enabled
+        else None
+    )
+
+    if _VISION_SEM is None:
+        raise RuntimeError("Семафор Vision API не инициализирован")
+
+    async with _VISION_SEM:
+        attempt: int = 0
+        while True:
+            response = await _send_payload(body, compressed, headers)
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or attempt >= STATUS_RETRIES
+            ):
+                break
+            # Слот семафора держим во время паузы — это и разгружает API
+            delay: float = _retry_delay(response, attempt)
+            logger.warning(
+                "Vision API вернул %d, повтор через %.1f с",
+                response.status_code,
+                delay,
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+    response.raise_for_status()
 
-    data: dict = response.json()
+    try:
+        data: dict = orjson.loads(response.content)
+    except orjson.JSONDecodeError as exc:
+        logger.error("Ответ API не является JSON: %s", response.text[:300])
+        raise ValueError("Не удалось разобрать ответ API") from exc
 
     # Извлекаем текст из ответа
     try:
@@ -161,26 +372,219 @@ async def call_vision_api(image_base64: str) -> str:
     return text
 
 
+# =========================================================================
+# Обновление OAuth-токена Qwen
+# =========================================================================
+
+def _save_creds(creds: dict) -> None:
+    """
+    Атомарно перезаписывает oauth_creds.json.
+
+    Новый файл пишется рядом и подменяется через os.replace, поэтому
+    читатели никогда не видят частично записанный JSON. Владелец и права
+    переносятся со старого файла, иначе после первого обновления из
+    контейнера (root) Qwen CLI на хосте не сможет его прочитать.
+    Кэш токена сбросится сам: у нового файла другие mtime и размер.
+    """
+    try:
+        old_st: Optional[os.stat_result] = os.stat(QWEN_OAUTH_CREDS_PATH)
+    except FileNotFoundError:
+        old_st = None
+
+    tmp_path: str = f"{QWEN_OAUTH_CREDS_PATH}.tmp"
+    fd: int = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        try:
+            if old_st is not None:
+                try:
+                    os.fchown(fd, old_st.st_uid, old_st.st_gid)
+                except PermissionError:
+                    # Не root — файл и так создаётся от нашего пользователя
+                    pass
+                os.fchmod(fd, stat.S_IMODE(old_st.st_mode))
+            os.write(fd, orjson.dumps(creds, option=orjson.OPT_INDENT_2))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, QWEN_OAUTH_CREDS_PATH)
+    except OSError:
+        # Не оставляем недописанный файл в ~/.qwen хоста
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+async def _request_token_refresh(refresh_token: str) -> dict:
+    """
+    Обновляет токен через Qwen OAuth2 API.
+
+    Returns:
+        dict с полями access_token, refresh_token, token_type,
+        expires_in, resource_url.
+
+    Raises:
+        httpx.HTTPError: При сетевой или HTTP-ошибке.
+        ValueError: Если API вернул не JSON или неуспешный статус.
+    """
+    if QWEN_CLIENT is None:
+        raise RuntimeError("HTTP-клиент Qwen не инициализирован")
+
+    response = await QWEN_CLIENT.post(
+        QWEN_OAUTH_TOKEN_URL,
+        data={
+            "client_id": QWEN_OAUTH_CLIENT_ID,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        },
+        # User-Agent обязателен: Alibaba Cloud WAF блокирует стандартные клиенты
+        headers={"User-Agent": "curl/7.81.0"},
+    )
+    response.raise_for_status()
+
+    # WAF может вернуть HTML вместо JSON — проверяем
+    if "text/html" in response.headers.get("Content-Type", ""):
+        raise ValueError("API вернул HTML вместо JSON (вероятно WAF-блокировка)")
+
+    try:
+        body: dict = orjson.loads(response.content)
+    except orjson.JSONDecodeError as exc:
+        raise ValueError(f"некорректный JSON: {response.text[:300]!r}") from exc
+
+    if body.get("status") != "success":
+        raise ValueError(f"неожиданный ответ API: {body}")
+
+    return body
+
+
+async def refresh_token_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Периодическая задача: обновляет OAuth-токен Qwen, если он скоро истечёт.
+
+    Заменяет cron-запуск отдельного скрипта — обновлённый токен сразу
+    виден get_qwen_token, а файл на хосте остаётся актуальным для Qwen CLI.
+    """
+    try:
+        creds: dict = _load_creds()
+    except (orjson.JSONDecodeError, OSError) as exc:
+        logger.error("Ошибка чтения %s: %s", QWEN_OAUTH_CREDS_PATH, exc)
+        return
+
+    # expiry_date хранится в миллисекундах (как в Qwen CLI)
+    remaining_sec: float = (int(creds.get("expiry_date") or 0) - time.time() * 1000) / 1000
+    if remaining_sec > REFRESH_THRESHOLD_SEC:
+        logger.debug("Токен действителен ещё %.0f сек — обновление не требуется", remaining_sec)
+        return
+
+    refresh_token: str = creds.get("refresh_token", "")
+    if not refresh_token:
+        logger.error("refresh_token отсутствует в %s. Выполните авторизацию: qwen", QWEN_OAUTH_CREDS_PATH)
+        return
+
+    logger.info("Токен истекает через %.0f сек — обновляем", remaining_sec)
+    try:
+        result: dict = await _request_token_refresh(refresh_token)
+    except httpx.HTTPStatusError as exc:
+        logger.error(
+            "HTTP ошибка %d при обновлении токена: %s",
+            exc.response.status_code,
+            exc.response.text,
+        )
+        if exc.response.status_code in (400, 401):
+            logger.error("refresh_token недействителен. Выполните: qwen")
+        return
+    except (httpx.HTTPError, ValueError) as exc:
+        logger.error("Не удалось обновить токен: %s", exc)
+        return
+
+    # Формируем обновлённый файл (как это делает Qwen CLI)
+    try:
+        new_creds: dict = {
+            "access_token": result["access_token"],
+            "token_type": result.get("token_type", "Bearer"),
+            "refresh_token": result["refresh_token"],
+            "resource_url": result.get("resource_url", "portal.qwen.ai"),
+            # CLI конвертирует expires_in (сек) → expiry_date (мс timestamp)
+            "expiry_date": int(time.time() * 1000) + int(result["expires_in"]) * 1000,
+        }
+    except (KeyError, TypeError, ValueError) as exc:
+        # Сам ответ не логируем — в нём токены
+        logger.error(
+            "Неполный ответ API при обновлении токена (поля: %s): %r",
+            sorted(result),
+            exc,
+        )
+        return
+
+    try:
+        _save_creds(new_creds)
+    except OSError as exc:
+        logger.error("Не удалось сохранить %s: %s", QWEN_OAUTH_CREDS_PATH, exc)
+        return
+
+    logger.info(
+        "Токен обновлён! Действителен %.1f ч",
+        (new_creds["expiry_date"] / 1000 - time.time()) / 3600,
+    )
+
+
 # =========================================================================
 # Вспомогательные функции
 # =========================================================================
 
-async def download_and_encode(file_obj, context: ContextTypes.DEFAULT_TYPE) -> str:
+def _maybe_downscale(raw: bytearray) -> bytes | bytearray:
+    """
+    Уменьшает изображение до MAX_IMAGE_SIDE по длинной стороне
+    и пережимает в JPEG. Небольшие и нераспознанные изображения
+    возвращаются без изменений.
+    """
+    try:
+        with Image.open(BytesIO(raw)) as img:
+            # Image.open читает только заголовок — размер известен без декодирования
+            if max(img.size) <= MAX_IMAGE_SIDE:
+                return raw
+            # Слишком большие по пикселям картинки (даже в пределах
+            # MAX_IMAGE_BYTES) не декодируем — отправляем как есть
+            if img.size[0] * img.size[1] > Image.MAX_IMAGE_PIXELS:
+                logger.warning("Изображение %dx%d слишком велико для уменьшения", *img.size)
+                return raw
+            # Сначала thumbnail: для JPEG он декодирует сразу в уменьшенном
+            # масштабе (draft). Рамка квадратная, поэтому поворот по EXIF
+            # после уменьшения даёт тот же результат
+            img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+            # Тег Orientation в JPEG не переносится — поворачиваем пиксели
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+                # Прозрачный фон при convert("RGB") становится чёрным —
+                # тёмный текст на нём не читается, подкладываем белый
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, "white")
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            out = BytesIO()
+            img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        logger.warning("Не удалось уменьшить изображение: %s", exc)
+        return raw
+
+    logger.info("Изображение уменьшено: %d → %d байт", len(raw), out.tell())
+    return out.getvalue()
+
+
+async def download_image(tg_file: File) -> bytes | bytearray:
     """
-    Скачивает файл из Telegram и кодирует его в base64.
+    Скачивает файл из Telegram в память и при необходимости уменьшает его.
 
     Args:
-        file_obj: Объект файла Telegram (PhotoSize / Document).
-        context: Контекст бота.
+        tg_file: Файл, полученный через bot.get_file.
 
     Returns:
-        Строка base64 без префикса.
+        Байты изображения, готовые к отправке в Vision API.
     """
-    tg_file = await context.bot.get_file(file_obj.file_id)
-    buf = BytesIO()
-    await tg_file.download_to_memory(buf)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode("utf-8")
+    raw: bytearray = await tg_file.download_as_bytearray()
+    return await asyncio.to_thread(_maybe_downscale, raw)
 
 
 # =========================================================================
@@ -189,18 +593,7 @@ async def download_and_encode(file_obj, context: ContextTypes.DEFAULT_TYPE) -> s
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start — приветствие и инструкция."""
-    welcome_text: str = (
-        "👋 *Привет!*\n\n"
-        "Я бот для распознавания текста с изображений.\n\n"
-        "📸 *Как пользоваться:*\n"
-        "1. Отправь мне фотографию или изображение-документ\n"
-        "2. Подожди несколько секунд\n"
-        "3. Получи распознанный текст в формате Markdown\n\n"
-        "💡 *Совет:* Для лучшего качества отправляй изображение "
-        "как документ (без сжатия).\n\n"
-        "Поддерживаемые форматы: JPEG, PNG, WebP, GIF."
-    )
-    await update.message.reply_text(welcome_text, parse_mode="Markdown")
+    await update.message.reply_text(WELCOME_TEXT, parse_mode="Markdown")
 
 
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -234,6 +627,19 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await _process_image(update, context, document)
 
 
+async def _edit_status(msg: Message, text: str) -> None:
+    """
+    Заменяет текст сообщения-индикатора сообщением об ошибке.
+
+    Если сообщение уже удалено или не изменилось, Telegram отвечает
+    BadRequest — повторять такой запрос бессмысленно, просто пропускаем.
+    """
+    try:
+        await msg.edit_text(text)
+    except BadRequest as exc:
+        logger.debug("Сообщение-индикатор недоступно: %s", exc)
+
+
 async def _process_image(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -247,68 +653,93 @@ async def _process_image(
         context: Контекст бота.
         file_obj: PhotoSize или Document из Telegram.
     """
-    # Отправляем индикатор обработки
-    processing_msg = await update.message.reply_text("⏳ Обрабатываю...")
-
-    try:
-        # Скачиваем и кодируем изображение
-        image_b64: str = await download_and_encode(file_obj, context)
-        logger.info(
-            "Изображение получено, размер base64: %d символов",
-            len(image_b64),
+    # Отсекаем слишком большие файлы до скачивания
+    if file_obj.file_size and file_obj.file_size > MAX_IMAGE_BYTES:
+        await update.message.reply_text(
+            f"⚠️ Файл слишком большой (>{MAX_IMAGE_BYTES >> 20} МБ)."
         )
+        return
 
-        # Вызываем Vision API
-        result_text: str = await call_vision_api(image_b64)
+    # Индикатор обработки и get_file — независимые запросы к Bot API,
+    # выполняем их параллельно
+    file_task = asyncio.create_task(context.bot.get_file(file_obj.file_id))
+    try:
+        processing_msg = await update.message.reply_text("⏳ Обрабатываю...")
+    except BaseException:
+        file_task.cancel()
+        raise
 
-        # Отправляем результат
-        reply: str = f"📝 *Текст:*\n\n{result_text}"
+    try:
+        # Скачиваем изображение
+        tg_file: File = await file_task
+        image: bytes | bytearray = await download_image(tg_file)
+        logger.info("Изображение получено, размер: %d байт", len(image))
 
-        # Telegram ограничивает длину сообщения — разбиваем если нужно
-        if len(reply) <= 4096:
-            await processing_msg.edit_text(reply, parse_mode="Markdown")
+        # Вызываем Vision API
+        result_text: str = await call_vision_api(image)
+
+        # Telegram ограничивает длину сообщения — разбиваем если нужно.
+        # Лимит считается после разбора разметки, поэтому длину проверяем
+        # и режем по исходному result_text, а экранируем для MarkdownV2
+        # уже отправляемые части (разметка модели часто не парсится,
+        # а каждый отказ — потраченный запрос к Bot API)
+        if len(REPLY_HEADER) + len(result_text) <= TELEGRAM_MAX_MESSAGE_LEN:
+            await processing_msg.edit_text(
+                f"{REPLY_HEADER}{result_text.translate(_MDV2)}",
+                parse_mode=ParseMode.MARKDOWN_V2,
+            )
         else:
-            # Разбиваем на части по 4096 символов
+            # Первая часть идёт в сообщение-индикатор, остальные — отдельными
+            # сообщениями без уведомления
             await processing_msg.edit_text(
-                "📝 *Текст (разбит на части из-за длины):*",
-                parse_mode="Markdown",
+                f"{REPLY_HEADER}{result_text[:REPLY_CHUNK_LEN].translate(_MDV2)}",
+                parse_mode=ParseMode.MARKDOWN_V2,
             )
-            for i in range(0, len(result_text), 4000):
-                chunk: str = result_text[i : i + 4000]
-                await update.message.reply_text(chunk)
+            for i in range(REPLY_CHUNK_LEN, len(result_text), REPLY_CHUNK_LEN):
+                await update.message.reply_text(
+                    result_text[i : i + REPLY_CHUNK_LEN].translate(_MDV2),
+                    parse_mode=ParseMode.MARKDOWN_V2,
+                    disable_notification=True,
+                )
 
     except httpx.TimeoutException:
         logger.error("Таймаут при запросе к Vision API")
-        await processing_msg.edit_text(
+        await _edit_status(
+            processing_msg,
             "⏱ Превышено время ожидания ответа от сервера. "
-            "Попробуйте ещё раз позже."
+            "Попробуйте ещё раз позже.",
+        )
+
+    except httpx.ConnectError as exc:
+        logger.error("Не удалось подключиться к Vision API: %s", exc)
+        await _edit_status(
+            processing_msg,
+            "🌐 Не удалось подключиться к серверу. Попробуйте позже.",
         )
 
     except httpx.HTTPStatusError as exc:
         status_code: int = exc.response.status_code
         logger.error("HTTP ошибка %d: %s", status_code, exc.response.text)
 
-        if status_code == 401:
-            error_msg = "🔑 Ошибка авторизации. Проверьте токен API."
-        elif status_code == 429:
-            error_msg = "🚦 Превышен лимит запросов. Попробуйте позже."
-        elif status_code >= 500:
-            error_msg = "🔧 Сервер временно недоступен. Попробуйте позже."
-        else:
-            error_msg = f"❌ Ошибка сервера (код {status_code}). Попробуйте позже."
+        error_msg: str = _HTTP_ERR_MSG.get(
+            500 if status_code >= 500 else status_code,
+            f"❌ Ошибка сервера (код {status_code}). Попробуйте позже.",
+        )
 
-        await processing_msg.edit_text(error_msg)
+        await _edit_status(processing_msg, error_msg)
 
     except ValueError as exc:
         logger.error("Ошибка разбора ответа API: %s", exc)
-        await processing_msg.edit_text(
-            "❌ Не удалось обработать ответ от сервера. Попробуйте ещё раз."
+        await _edit_status(
+            processing_msg,
+            "❌ Не удалось обработать ответ от сервера. Попробуйте ещё раз.",
         )
 
     except Exception as exc:
         logger.exception("Непредвиденная ошибка: %s", exc)
-        await processing_msg.edit_text(
-            "❌ Произошла непредвиденная ошибка. Попробуйте позже."
+        await _edit_status(
+            processing_msg,
+            "❌ Произошла непредвиденная ошибка. Попробуйте позже.",
         )
 
 
@@ -316,8 +747,32 @@ async def _process_image(
 # Запуск бота
 # =========================================================================
 
+async def on_startup(app: Application) -> None:
+    """Создаёт общий HTTP/2-клиент и семафор для Qwen API."""
+    global QWEN_CLIENT, _VISION_SEM
+    _VISION_SEM = asyncio.Semaphore(QWEN_MAX_CONCURRENCY)
+    QWEN_CLIENT = httpx.AsyncClient(
+        timeout=API_TIMEOUT,
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+    logger.info("HTTP-клиент Qwen создан")
+
+
+async def on_shutdown(app: Application) -> None:
+    """Закрывает общий HTTP-клиент Qwen."""
+    global QWEN_CLIENT, _VISION_SEM
+    _VISION_SEM = None
+    if QWEN_CLIENT is not None:
+        await QWEN_CLIENT.aclose()
+        QWEN_CLIENT = None
+        logger.info("HTTP-клиент Qwen закрыт")
+
+
 def main() -> None:
     """Точка входа — создание и запуск бота."""
+    global QWEN_MAX_CONCURRENCY
+
     # Проверяем наличие обязательных токенов
     if not TELEGRAM_TOKEN:
         logger.critical("Не задана переменная окружения TELEGRAM_TOKEN")
@@ -338,12 +793,49 @@ def main() -> None:
         logger.critical("Не удалось загрузить токен из %s: %s", QWEN_OAUTH_CREDS_PATH, exc)
         sys.exit(1)
 
+    # Ограничение параллельных запросов к Vision API: при 0 все вызовы
+    # ждали бы семафор вечно
+    try:
+        QWEN_MAX_CONCURRENCY = int(QWEN_MAX_CONCURRENCY_ENV)
+    except ValueError:
+        QWEN_MAX_CONCURRENCY = 0
+    if QWEN_MAX_CONCURRENCY < 1:
+        logger.critical(
+            "QWEN_MAX_CONCURRENCY должно быть целым числом ≥ 1, получено %r",
+            QWEN_MAX_CONCURRENCY_ENV,
+        )
+        sys.exit(1)
+
     logger.info("Запуск E13 OCR Bot...")
 
+    # uvloop — более быстрая реализация event loop на libuv.
+    # Политика задаётся до создания приложения, run_polling подхватит её
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Используется uvloop")
+
+    # Пул соединений к Bot API: параллельные обработчики не ждут
+    # друг друга на единственном соединении, HTTP/2 мультиплексирует запросы
+    request = HTTPXRequest(
+        connection_pool_size=64,
+        http_version="2",
+        read_timeout=30,
+        write_timeout=30,
+        pool_timeout=10,
+    )
+    # getUpdates выполняется последовательно — одного соединения достаточно
+    get_updates_request = HTTPXRequest(connection_pool_size=1, http_version="2")
+
     # Создаём приложение бота
     app: Application = (
         Application.builder()
         .token(TELEGRAM_TOKEN)
+        .request(request)
+        .get_updates_request(get_updates_request)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .rate_limiter(AIORateLimiter(max_retries=TELEGRAM_MAX_RETRIES))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
         .build()
     )
 
@@ -354,6 +846,13 @@ def main() -> None:
         MessageHandler(filters.Document.ALL, handle_document)
     )
 
+    # Периодическое обновление OAuth-токена Qwen (первая проверка — сразу)
+    app.job_queue.run_repeating(
+        refresh_token_job,
+        interval=REFRESH_CHECK_INTERVAL_SEC,
+        first=0,
+    )
+
     # Graceful shutdown: корректное завершение при SIGINT / SIGTERM
     logger.info("Бот запущен. Ожидание сообщений...")
     app.run_polling(